@@ -10,11 +10,14 @@ What You'll Learn:
 - Relationships between tables (One-to-Many)
 
 Prerequisites: Complete part-1 and part-2
-Install: pip install flask-sqlalchemy
+Install: pip install flask-sqlalchemy flask-caching
 """
 
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, render_template, request, redirect, url_for, flash, g
+from flask_caching import Cache
 from flask_sqlalchemy import SQLAlchemy  # Import SQLAlchemy
+from sqlalchemy import event, select
+from sqlalchemy.orm import joinedload, lazyload, raiseload, selectinload  # Loader strategies
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key'
@@ -27,6 +30,23 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False  # Disable warning
 
 db = SQLAlchemy(app)  # Initialize SQLAlchemy with app
 
+# SQLite tuning - applied to each new database connection
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')  # Readers don't block the writer
+    cursor.execute('PRAGMA synchronous=NORMAL')  # Fewer disk syncs, still safe with WAL
+    cursor.execute('PRAGMA cache_size=-64000')  # ~64 MB page cache
+    cursor.execute('PRAGMA temp_store=MEMORY')  # Temp tables/sorts in RAM
+    cursor.close()
+
+
+with app.app_context():
+    event.listen(db.engine, 'connect', set_sqlite_pragmas)  # Runs on every new connection
+
+# In-memory result cache for data that rarely changes (e.g. course dropdown)
+app.config['CACHE_TYPE'] = 'SimpleCache'
+cache = Cache(app)
+
 
 # =============================================================================
 # MODELS (Python Classes = Database Tables)
@@ -41,8 +61,8 @@ class Teacher(db.Model):
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
 
-    # One teacher -> many courses
-    courses = db.relationship('Course', backref='teacher', lazy=True)
+    # One teacher -> many courses (loaded only when used)
+    courses = db.relationship('Course', back_populates='teacher', lazy='select')
 
     def __repr__(self):
         return f'<Teacher {self.name}>'
@@ -55,9 +75,11 @@ class Course(db.Model):
 
     # Foreign key to Teacher
     teacher_id = db.Column(db.Integer, db.ForeignKey('teacher.id'), nullable=False)
+    # A course almost always shows its teacher: fetch it in the same query (JOIN)
+    teacher = db.relationship('Teacher', back_populates='courses', lazy='joined')
 
-    # One course -> many students
-    students = db.relationship('Student', backref='course', lazy=True)
+    # One course -> many students (can be a big list, so loaded only when used)
+    students = db.relationship('Student', back_populates='course', lazy='select')
 
     def __repr__(self):
         return f'<Course {self.name}>'
@@ -69,10 +91,31 @@ class Student(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
 
     course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False)
+    course = db.relationship('Course', back_populates='students', lazy='joined')  # One row - JOIN it
 
     def __repr__(self):
         return f'<Student {self.name}>'
 
+# =============================================================================
+# CACHED QUERIES
+# =============================================================================
+
+@cache.memoize(timeout=60)
+def _all_courses():
+    # Plain (id, name) rows, not Course objects - safe to keep between requests
+    return db.session.execute(
+        select(Course.id, Course.name).order_by(Course.name)
+    ).all()
+
+
+def get_courses_cached():
+    # Course list for dropdowns: cached for this request in `g`, and for
+    # 60 seconds across requests. add_course() clears it.
+    if 'courses' not in g:
+        g.courses = _all_courses()
+    return g.courses
+
+
 # =============================================================================
 # ROUTES - Using ORM instead of raw SQL
 # =============================================================================
@@ -81,13 +124,27 @@ class Student(db.Model):
 def index():
     # OLD WAY (raw SQL): conn.execute('SELECT * FROM students').fetchall()
     # NEW WAY (ORM):
-    students = Student.query.all()  # Get all students
+    # Course and teacher are JOINed in (one query - same as the relationship
+    # defaults). raiseload('*') replaces those defaults too, so the path has
+    # to be named here; any other relationship access then fails loudly
+    # instead of quietly running one extra query per row (the N+1 problem).
+    stmt = select(Student).options(
+        joinedload(Student.course).joinedload(Course.teacher),
+        raiseload('*'),
+    )
+    students = db.session.scalars(stmt).all()
     return render_template('index.html', students=students)
 
 
 @app.route('/courses')
 def courses():
-    all_courses = Course.query.all()  # Get all courses
+    # Teachers are JOINed by default; students come in one extra query, not
+    # one per course. lazyload() stops each student re-JOINing the course it
+    # was loaded from - student.course is already in the session.
+    stmt = select(Course).options(
+        selectinload(Course.students).lazyload(Student.course),
+    )
+    all_courses = db.session.execute(stmt).scalars().all()
     return render_template('courses.html', courses=all_courses)
 
 
@@ -107,7 +164,7 @@ def add_student():
         flash('Student added successfully!', 'success')
         return redirect(url_for('index'))
 
-    courses = Course.query.all()  # Get courses for dropdown
+    courses = get_courses_cached()  # Get courses for dropdown
     return render_template('add.html', courses=courses)
 
 
@@ -126,7 +183,7 @@ def edit_student(id):
         flash('Student updated!', 'success')
         return redirect(url_for('index'))
 
-    courses = Course.query.all()
+    courses = get_courses_cached()
     return render_template('edit.html', student=student, courses=courses)
 
 
@@ -149,6 +206,7 @@ def add_course():
         new_course = Course(name=name, description=description)
         db.session.add(new_course)
         db.session.commit()
+        cache.delete_memoized(_all_courses)  # Dropdowns must show the new course
 
         flash('Course added!', 'success')
         return redirect(url_for('courses'))
@@ -157,15 +215,23 @@ def add_course():
 
 @app.route('/queries-demo')
 def queries_demo():
+    # One query for all three demos: fetch the sorted names once (just the
+    # names - no Student objects are built), then filter/slice in Python
+    names = db.session.scalars(select(Student.name).order_by(Student.name)).all()
     return {
-        "filter": [s.name for s in Student.query.filter(Student.name.like('%a%')).all()],
-        "order_by": [s.name for s in Student.query.order_by(Student.name).all()],
-        "limit": [s.name for s in Student.query.limit(2).all()]
+        "filter": [name for name in names if 'a' in name.lower()],  # Like LIKE '%a%'
+        "order_by": names,
+        "limit": names[:2]
     }
 
 @app.route('/teachers')
 def teachers():
-    teachers = Teacher.query.all()
+    # All courses arrive in one extra query, not one per teacher. lazyload()
+    # skips JOINing back to the teacher that's already loaded.
+    stmt = select(Teacher).options(
+        selectinload(Teacher.courses).lazyload(Course.teacher)
+    )
+    teachers = db.session.execute(stmt).scalars().all()
     return render_template('teachers.html', teachers=teachers)
 
 # =============================================================================
@@ -176,34 +242,35 @@ def init_db():
     with app.app_context():
         db.create_all()
 
-        if Teacher.query.count() == 0:
-            teachers = [
-                Teacher(name='Mr. Sharma', email='sharma@school.com'),
-                Teacher(name='Ms. Patil', email='patil@school.com'),
-            ]
-            db.session.add_all(teachers)
-            db.session.commit()
-
-        if Course.query.count() == 0:
-            courses = [
-                Course(
-                    name='Python Basics',
-                    description='Learn Python fundamentals',
-                    teacher_id=1
-                ),
-                Course(
-                    name='Web Development',
-                    description='HTML, CSS, Flask',
-                    teacher_id=2
-                ),
-                Course(
-                    name='Data Science',
-                    description='Data analysis with Python',
-                    teacher_id=1
-                )
-            ]
-            db.session.add_all(courses)
-            db.session.commit()
+        # One transaction for all seed data: a single commit (and a single
+        # disk sync) at the end of the block instead of one per table
+        with db.session.begin():
+            # bulk_insert_mappings() takes plain dicts and skips building ORM
+            # objects - much faster when seeding or importing many rows
+            if Teacher.query.count() == 0:
+                db.session.bulk_insert_mappings(Teacher, [
+                    {'name': 'Mr. Sharma', 'email': 'sharma@school.com'},
+                    {'name': 'Ms. Patil', 'email': 'patil@school.com'},
+                ])
+
+            if Course.query.count() == 0:
+                db.session.bulk_insert_mappings(Course, [
+                    {
+                        'name': 'Python Basics',
+                        'description': 'Learn Python fundamentals',
+                        'teacher_id': 1
+                    },
+                    {
+                        'name': 'Web Development',
+                        'description': 'HTML, CSS, Flask',
+                        'teacher_id': 2
+                    },
+                    {
+                        'name': 'Data Science',
+                        'description': 'Data analysis with Python',
+                        'teacher_id': 1
+                    }
+                ])
 
 
 if __name__ == '__main__':
@@ -11,19 +11,58 @@ What You'll Learn:
 - Testing APIs with curl or Postman
 
 Prerequisites: Complete part-3 (SQLAlchemy)
+Install: pip install orjson
 """
 
-from flask import Flask, request, jsonify
+import orjson  # Fast JSON library (written in Rust)
+from flask import Flask, Response, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_, bindparam, column, delete, event, func, insert, or_, select, table
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError, OperationalError
 from datetime import datetime
 
+
+# jsonify() uses this class to turn Python data into JSON. orjson is several
+# times faster than the standard json module - it matters when a response
+# holds hundreds of books.
+class ORJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2  # Pretty output in debug mode
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///api_demo.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 db = SQLAlchemy(app)
 
 
+# =============================================================================
+# SQLITE TUNING
+# =============================================================================
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')  # Readers don't block the writer
+    cursor.execute('PRAGMA synchronous=NORMAL')  # Fewer disk syncs, still safe with WAL
+    cursor.execute('PRAGMA cache_size=-64000')  # ~64 MB page cache
+    cursor.execute('PRAGMA temp_store=MEMORY')  # Temp tables/sorts in RAM
+    cursor.close()
+
+
+with app.app_context():
+    event.listen(db.engine, 'connect', set_sqlite_pragmas)  # Runs on every new connection
+
+
 # =============================================================================
 # MODELS
 # =============================================================================
@@ -36,6 +75,10 @@ class Book(db.Model):
     isbn = db.Column(db.String(20), unique=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_book_year', 'year'),  # Speeds up ?year= filtering
+    )
+
     def to_dict(self):  # Convert model to dictionary for JSON response
         return {
             'id': self.id,
@@ -47,35 +90,191 @@ class Book(db.Model):
         }
 
 
+# Columns the API may sort by (?sort=...). A fixed list means a user can't
+# pick an arbitrary attribute like 'query' or 'metadata'.
+SORT_COLUMNS = {
+    'id': Book.id,
+    'title': Book.title,
+    'author': Book.author,
+    'year': Book.year,
+}
+
+
+# =============================================================================
+# FULL-TEXT SEARCH (SQLite FTS5)
+# =============================================================================
+# ilike('%python%') can't use a normal index, so it reads every row. book_fts is
+# a search index over title/author; the trigram tokenizer matches substrings
+# case-insensitively (like ilike) for search terms of 3+ characters.
+# Triggers keep it in sync with the book table. init_db() sets it all up.
+# The trigram tokenizer needs SQLite 3.34+; on older versions search falls
+# back to ilike().
+
+BOOK_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS book_fts USING fts5(
+        title, author, content='book', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS book_fts_insert AFTER INSERT ON book BEGIN
+        INSERT INTO book_fts(rowid, title, author) VALUES (new.id, new.title, new.author);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS book_fts_delete AFTER DELETE ON book BEGIN
+        INSERT INTO book_fts(book_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS book_fts_update AFTER UPDATE ON book BEGIN
+        INSERT INTO book_fts(book_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+        INSERT INTO book_fts(rowid, title, author) VALUES (new.id, new.title, new.author);
+    END""",
+]
+
+FTS_MIN_LENGTH = 3  # Trigram index can't match shorter terms
+
+book_fts = table('book_fts', column('rowid'))  # Lightweight handle for joins
+
+
+def create_book_fts():
+    # Safe to run on every start (IF NOT EXISTS), so databases created
+    # before book_fts existed get it too
+    try:
+        with db.engine.begin() as connection:
+            exists = connection.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'book_fts'"
+            ).first()
+
+            for statement in BOOK_FTS_DDL:
+                connection.exec_driver_sql(statement)
+
+            if not exists:
+                # New search index: fill it with the books already in the table
+                connection.exec_driver_sql("INSERT INTO book_fts(book_fts) VALUES ('rebuild')")
+    except OperationalError as e:
+        # e.g. "no such tokenizer: trigram" on SQLite older than 3.34
+        print('Full-text search unavailable, using LIKE instead:', e.orig)
+        app.config['BOOK_FTS_ENABLED'] = False
+        return
+
+    app.config['BOOK_FTS_ENABLED'] = True
+
+
+def use_fts(value):
+    # Only when init_db() set up book_fts and the term is long enough to match
+    return app.config.get('BOOK_FTS_ENABLED', False) and len(value) >= FTS_MIN_LENGTH
+
+
+def fts_phrase(field, value):
+    # Quote the user's text so FTS5 treats it as a literal phrase
+    escaped = value.replace('"', '""')
+    return f'{field} : "{escaped}"'
+
+
+# =============================================================================
+# KEYSET PAGINATION
+# =============================================================================
+# OFFSET pagination makes the database read and throw away every row before
+# the page, so deep pages get slower and slower. Keyset pagination remembers
+# the last row sent (its sort value + id) and asks for rows *after* it - every
+# page costs the same. The id is the tie-breaker for equal sort values.
+
+def parse_sort_value(column, raw):
+    # Turn the ?after= string back into the column's Python type
+    if raw == '':
+        return None  # The last row had NULL in the sort column
+    return column.type.python_type(raw)
+
+
+def keyset_condition(column, descending, after_value, after_id):
+    # Rows that come after (after_value, after_id) in the sort order.
+    # SQLite sorts NULLs first ascending and last descending.
+    if not descending:
+        if after_value is None:
+            return or_(column.is_not(None), and_(column.is_(None), Book.id > after_id))
+        return or_(column > after_value, and_(column == after_value, Book.id > after_id))
+
+    if after_value is None:
+        return and_(column.is_(None), Book.id < after_id)
+    return or_(
+        column < after_value,
+        and_(column == after_value, Book.id < after_id),
+        column.is_(None)
+    )
+
+
 # =============================================================================
 # REST API ROUTES
 # =============================================================================
 
 @app.route('/api/books', methods=['GET'])
 def get_books():
-    page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 5, type=int)
+    per_page = max(1, min(per_page, 100))  # Keep page size between 1 and 100
 
     sort = request.args.get('sort', 'id')
     order = request.args.get('order', 'asc')
+    descending = order == 'desc'
 
-    query = Book.query
+    # Cursor from the previous page (the "next" value of its response)
+    after_id = request.args.get('after_id', type=int)
+    after = request.args.get('after')
 
-    # Sorting
-    if hasattr(Book, sort):
-        column = getattr(Book, sort)
-        if order == 'desc':
-            column = column.desc()
-        query = query.order_by(column)
+    column = SORT_COLUMNS.get(sort, Book.id)  # Unknown sort -> id
 
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    # Only fetch the columns the list shows - no Book objects, no created_at
+    stmt = select(
+        Book.id, Book.title, Book.author, Book.year, Book.isbn,
+        column.label('sort_value')
+    )
 
-    return jsonify({
+    if after_id is not None:
+        # after= (empty) means the last row's sort value was NULL; leaving it
+        # out entirely would silently restart from page 1
+        if after is None:
+            return jsonify({'success': False, 'error': '"after" is required with "after_id"'}), 400
+        try:
+            after_value = parse_sort_value(column, after)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid "after" value'}), 400
+        stmt = stmt.where(keyset_condition(column, descending, after_value, after_id))
+
+    # Sorting (id breaks ties so the order is always the same)
+    if descending:
+        stmt = stmt.order_by(column.desc(), Book.id.desc())
+    else:
+        stmt = stmt.order_by(column, Book.id)
+
+    # Ask for one extra row to find out if there is another page
+    rows = db.session.execute(stmt.limit(per_page + 1)).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    next_cursor = None
+    if has_more:
+        next_cursor = {'after': rows[-1].sort_value, 'after_id': rows[-1].id}
+
+    response = {
         'success': True,
-        'page': page,
         'per_page': per_page,
-        'total': pagination.total,
-        'books': [book.to_dict() for book in pagination.items]
+        'has_more': has_more,
+        'next': next_cursor,
+        'books': [
+            {'id': row.id, 'title': row.title, 'author': row.author, 'year': row.year, 'isbn': row.isbn}
+            for row in rows
+        ]
+    }
+
+    # Counting every row is expensive - only do it when asked
+    if request.args.get('include_total') == '1':
+        response['total'] = db.session.execute(select(func.count(Book.id))).scalar()
+
+    return jsonify(response)
+
+
+# GET /api/books/<id> - Get single book
+@app.route('/api/books/<int:id>', methods=['GET'])
+def get_book(id):
+    book = db.get_or_404(Book, id, description='Book not found')
+
+    return jsonify({
+        'success': True,
+        'book': book.to_dict()
     })
 
 
@@ -91,37 +290,80 @@ def create_book():
     if not data.get('title') or not data.get('author'):
         return jsonify({'success': False, 'error': 'Title and author are required'}), 400
 
-    # Check for duplicate ISBN
-    if data.get('isbn'):
-        existing = Book.query.filter_by(isbn=data['isbn']).first()
-        if existing:
-            return jsonify({'success': False, 'error': 'ISBN already exists'}), 400
-
-    # Create book
-    new_book = Book(
+    # Create book. If the ISBN is already taken, the unique index makes the
+    # INSERT do nothing - one statement instead of "SELECT, then INSERT",
+    # and no gap where another request could add the same ISBN.
+    stmt = sqlite_insert(Book).values(
         title=data['title'],
         author=data['author'],
         year=data.get('year'),  # Optional field
         isbn=data.get('isbn')
-    )
+    ).on_conflict_do_nothing(index_elements=['isbn']).returning(Book)
+
+    new_book = db.session.execute(stmt).scalar()
+
+    if new_book is None:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'ISBN already exists'}), 400
 
-    db.session.add(new_book)
+    book = new_book.to_dict()  # RETURNING gave us every column - no reload needed
     db.session.commit()
 
     return jsonify({
         'success': True,
         'message': 'Book created successfully',
-        'book': new_book.to_dict()
+        'book': book
     }), 201  # 201 = Created
 
 
+# POST /api/books/bulk - Create many books in one transaction
+@app.route('/api/books/bulk', methods=['POST'])
+def create_books_bulk():
+    data = request.get_json()
+
+    if not data or not isinstance(data.get('books'), list) or not data['books']:
+        return jsonify({'success': False, 'error': 'A non-empty "books" list is required'}), 400
+
+    # Validate everything first so we never save half a batch
+    rows = []
+    for i, book in enumerate(data['books']):
+        if not isinstance(book, dict) or not book.get('title') or not book.get('author'):
+            return jsonify({'success': False, 'error': f'Book {i}: title and author are required'}), 400
+        if not isinstance(book['title'], str) or not isinstance(book['author'], str):
+            return jsonify({'success': False, 'error': f'Book {i}: title and author must be text'}), 400
+        year = book.get('year')
+        if year is not None and (not isinstance(year, int) or isinstance(year, bool)):
+            return jsonify({'success': False, 'error': f'Book {i}: year must be a whole number'}), 400
+        if book.get('isbn') is not None and not isinstance(book['isbn'], str):
+            return jsonify({'success': False, 'error': f'Book {i}: isbn must be text'}), 400
+        rows.append({
+            'title': book['title'],
+            'author': book['author'],
+            'year': book.get('year'),
+            'isbn': book.get('isbn')
+        })
+
+    # One INSERT batch + one commit, instead of one commit (and disk sync) per book.
+    # Core insert() skips building Book objects entirely - the fastest option
+    # for large batches. created_at is still filled in by the column default.
+    try:
+        db.session.execute(insert(Book), rows)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'ISBN already exists'}), 400
+
+    return jsonify({
+        'success': True,
+        'message': f'{len(rows)} books created successfully',
+        'count': len(rows)
+    }), 201
+
+
 # PUT /api/books/<id> - Update book
 @app.route('/api/books/<int:id>', methods=['PUT'])
 def update_book(id):
-    book = Book.query.get(id)
-
-    if not book:
-        return jsonify({'success': False, 'error': 'Book not found'}), 404
+    book = db.get_or_404(Book, id, description='Book not found')  # Checks the session before querying
 
     data = request.get_json()
 
@@ -150,12 +392,12 @@ def update_book(id):
 # DELETE /api/books/<id> - Delete book
 @app.route('/api/books/<int:id>', methods=['DELETE'])
 def delete_book(id):
-    book = Book.query.get(id)
+    # One DELETE statement - no need to load the book first
+    result = db.session.execute(delete(Book).where(Book.id == id))
 
-    if not book:
+    if result.rowcount == 0:
         return jsonify({'success': False, 'error': 'Book not found'}), 404
 
-    db.session.delete(book)
     db.session.commit()
 
     return jsonify({
@@ -164,6 +406,12 @@ def delete_book(id):
     })
 
 
+# Errors raised with abort(404) / get_or_404 are returned as JSON too
+@app.errorhandler(404)
+def not_found(error):
+    return jsonify({'success': False, 'error': error.description}), 404
+
+
 # =============================================================================
 # BONUS: Search and Filter
 # =============================================================================
@@ -171,30 +419,81 @@ def delete_book(id):
 # GET /api/books/search?q=python&author=john
 @app.route('/api/books/search', methods=['GET'])
 def search_books():
-    query = Book.query
+    title = request.args.get('q')  # Query parameter: ?q=python
+    author = request.args.get('author')
+    year = request.args.get('year')
+
+    # Reject bad input before touching the database
+    if year:
+        try:
+            year = int(year)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Year must be a number'}), 400
+    else:
+        year = None
+
+    # Collect every condition, then build ONE WHERE clause. Values are passed
+    # as bind parameters, so the SQL text is the same for every search with
+    # the same filters and SQLAlchemy can reuse its compiled statement.
+    conditions = []
+    params = {}
+    fts_terms = []  # Searches answered by the book_fts index
 
     # Filter by title (partial match)
-    title = request.args.get('q')  # Query parameter: ?q=python
     if title:
-        query = query.filter(Book.title.ilike(f'%{title}%'))  # Case-insensitive LIKE
+        if use_fts(title):
+            fts_terms.append(fts_phrase('title', title))
+        else:
+            conditions.append(Book.title.ilike(bindparam('title')))  # Case-insensitive LIKE
+            params['title'] = f'%{title}%'
 
     # Filter by author
-    author = request.args.get('author')
     if author:
-        query = query.filter(Book.author.ilike(f'%{author}%'))
+        if use_fts(author):
+            fts_terms.append(fts_phrase('author', author))
+        else:
+            conditions.append(Book.author.ilike(bindparam('author')))
+            params['author'] = f'%{author}%'
 
     # Filter by year
-    year = request.args.get('year')
-    if year:
-        query = query.filter_by(year=int(year))
-
-    books = query.all()
-
-    return jsonify({
-        'success': True,
-        'count': len(books),
-        'books': [book.to_dict() for book in books]
-    })
+    if year is not None:
+        conditions.append(Book.year == bindparam('year'))
+        params['year'] = year
+
+    # Plain columns (no Book objects) - the rows are read after this view
+    # returns, when the request's session is already closed
+    stmt = select(Book.id, Book.title, Book.author, Book.year, Book.isbn, Book.created_at)
+    if fts_terms:
+        stmt = stmt.join(book_fts, book_fts.c.rowid == Book.id)
+        conditions.append(column('book_fts').match(bindparam('match')))
+        params['match'] = ' AND '.join(fts_terms)
+    if conditions:
+        stmt = stmt.where(and_(*conditions))
+
+    # Run the query now, on its own connection, so a database error still
+    # becomes a normal error response. yield_per(500) fetches rows in chunks
+    # of 500 instead of all at once.
+    connection = db.engine.connect()
+    try:
+        result = connection.execution_options(yield_per=500).execute(stmt, params)
+    except Exception:
+        connection.close()
+        raise
+
+    # Stream the JSON as each chunk arrives: memory use stays flat and the
+    # client starts receiving data right away, however many books match
+    def generate():
+        yield b'{"success":true,"books":['
+        count = 0
+        for rows in result.partitions():
+            chunk = b','.join(orjson.dumps(row._asdict()) for row in rows)
+            yield (b',' if count else b'') + chunk
+            count += len(rows)
+        yield b'],"count":%d}' % count
+
+    response = Response(generate(), mimetype='application/json')
+    response.call_on_close(connection.close)  # Runs when streaming ends
+    return response
 
 
 # =============================================================================
@@ -244,14 +543,27 @@ def index():
 let page = 1;
 let sort = 'id';
 let order = 'asc';
+let total = 0;
+let cursors = [null];  // cursors[i] = where page i + 1 starts
+let hasMore = false;
 
 function loadBooks(sortField = null) {
     if (sortField) {
         sort = sortField;
         order = order === 'asc' ? 'desc' : 'asc';
+        page = 1;
+        cursors = [null];
+    }
+
+    let url = `/api/books?per_page=5&sort=${sort}&order=${order}`;
+    const cursor = cursors[page - 1];
+    if (cursor) {
+        url += `&after_id=${cursor.after_id}&after=${encodeURIComponent(cursor.after ?? '')}`;
+    } else {
+        url += '&include_total=1';
     }
 
-    fetch(`/api/books?page=${page}&per_page=5&sort=${sort}&order=${order}`)
+    fetch(url)
         .then(res => res.json())
         .then(data => {
             const table = document.getElementById('bookTable');
@@ -268,14 +580,22 @@ function loadBooks(sortField = null) {
                 `;
             });
 
+            if (data.total !== undefined) {
+                total = data.total;
+            }
+            hasMore = data.has_more;
+            cursors[page] = data.next;
+
             document.getElementById('pageInfo').innerText =
-                `Page ${page} | Total Books: ${data.total}`;
+                `Page ${page} | Total Books: ${total}`;
         });
 }
 
 function nextPage() {
-    page++;
-    loadBooks();
+    if (hasMore) {
+        page++;
+        loadBooks();
+    }
 }
 
 function prevPage() {
@@ -302,15 +622,16 @@ loadBooks();
 def init_db():
     with app.app_context():
         db.create_all()
+        create_book_fts()
 
         if Book.query.count() == 0:
             sample_books = [
-                Book(title='Python Crash Course', author='Eric Matthes', year=2019, isbn='978-1593279288'),
-                Book(title='Flask Web Development', author='Miguel Grinberg', year=2018, isbn='978-1491991732'),
-                Book(title='Clean Code', author='Robert C. Martin', year=2008, isbn='978-0132350884'),
+                {'title': 'Python Crash Course', 'author': 'Eric Matthes', 'year': 2019, 'isbn': '978-1593279288'},
+                {'title': 'Flask Web Development', 'author': 'Miguel Grinberg', 'year': 2018, 'isbn': '978-1491991732'},
+                {'title': 'Clean Code', 'author': 'Robert C. Martin', 'year': 2008, 'isbn': '978-0132350884'},
             ]
-            db.session.add_all(sample_books)
-            db.session.commit()
+            db.session.bulk_insert_mappings(Book, sample_books)  # Plain dicts, no Book objects
+            db.session.commit()  # Single commit for the whole list
             print('Sample books added!')
 
 
@@ -1,6 +1,7 @@
 from flask import Flask, render_template, request, redirect, url_for
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func
+from sqlalchemy import event, func, select
+from sqlalchemy.types import TypeDecorator
 
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///inventory.db'
@@ -8,12 +9,44 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 db = SQLAlchemy(app)
 
+# ---------------- SQLITE TUNING ----------------
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')  # Readers don't block the writer
+    cursor.execute('PRAGMA synchronous=NORMAL')  # Fewer disk syncs, still safe with WAL
+    cursor.execute('PRAGMA cache_size=-64000')  # ~64 MB page cache
+    cursor.execute('PRAGMA temp_store=MEMORY')  # Temp tables/sorts in RAM
+    cursor.close()
+
+
+with app.app_context():
+    event.listen(db.engine, 'connect', set_sqlite_pragmas)  # Runs on every new connection
+
+# ---------------- COLUMN TYPES ----------------
+# Form values arrive as strings ('5', '2.50'). These types convert them once,
+# when the value is sent to the database, so routes can pass form data as-is.
+class CoercedInt(TypeDecorator):
+    impl = db.Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return int(value) if isinstance(value, str) else value
+
+
+class CoercedFloat(TypeDecorator):
+    impl = db.Float
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return float(value) if isinstance(value, str) else value
+
+
 # ---------------- MODEL ----------------
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    quantity = db.Column(db.Integer, default=0)
-    price = db.Column(db.Float, nullable=False)
+    quantity = db.Column(CoercedInt, default=0)  # Accepts '5' as well as 5
+    price = db.Column(CoercedFloat, nullable=False)  # Accepts '2.50' as well as 2.5
 
 # ---------------- ROUTES ----------------
 
@@ -26,13 +59,21 @@ def index():
         products = Product.query.filter(
             Product.name.ilike(f"%{search}%")
         ).all()
+        # Totals for the matching products - already in memory, no extra query
+        total_products = len(products)
+        total_value = sum((p.quantity or 0) * p.price for p in products)
     else:
-        products = Product.query.all()
-
-    total_products = Product.query.count()
-    total_value = db.session.query(
-        func.sum(Product.quantity * Product.price)
-    ).scalar() or 0
+        # One query: every product plus the count and value as window columns
+        rows = db.session.execute(
+            select(
+                Product,
+                func.count().over().label('total_products'),
+                func.sum(Product.quantity * Product.price).over().label('total_value')
+            )
+        ).all()
+        products = [row.Product for row in rows]
+        total_products = rows[0].total_products if rows else 0
+        total_value = (rows[0].total_value if rows else 0) or 0
 
     return render_template(
         'index.html',
@@ -47,8 +88,8 @@ def add_product():
     if request.method == 'POST':
         product = Product(
             name=request.form['name'],
-            quantity=int(request.form['quantity']),
-            price=float(request.form['price'])
+            quantity=request.form['quantity'],  # Converted by CoercedInt
+            price=request.form['price']  # Converted by CoercedFloat
         )
         db.session.add(product)
         db.session.commit()
@@ -63,8 +104,8 @@ def edit_product(id):
 
     if request.method == 'POST':
         product.name = request.form['name']
-        product.quantity = int(request.form['quantity'])
-        product.price = float(request.form['price'])
+        product.quantity = request.form['quantity']
+        product.price = request.form['price']
         db.session.commit()
         return redirect(url_for('index'))
 
@@ -83,4 +124,3 @@ if __name__ == '__main__':
     with app.app_context():
         db.create_all()
     app.run(debug=True)
-S
\ No newline at end of file